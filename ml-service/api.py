@@ -1,51 +1,215 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+import asyncio
 import logging
 import os
+import sys
+import msgspec
 from dotenv import load_dotenv
 
 from classification.auto_tagger import AutoTagger
 
 load_dotenv()
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv('LOG_LEVEL', 'WARNING').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
+logging.getLogger('transformers').setLevel(logging.ERROR)
+logging.getLogger('urllib3').setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
+@cache
+def _env_flag(name: str, default: str = 'false') -> bool:
+    return os.getenv(name, default).lower() == 'true'
+
+@cache
+def _env_list(name: str, lowercase: bool = False) -> frozenset:
+    values = (value.strip() for value in os.getenv(name, '').split(','))
+    return frozenset(value.lower() if lowercase else value for value in values if value)
+
+class MsgspecResponse(Response):
+    """JSON response encoded with msgspec's C encoder."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return msgspec.json.encode(content)
+
 app = FastAPI(
     title="Query Tracking ML Service",
     description="AI/ML service for query classification, sentiment analysis, and priority detection",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=MsgspecResponse
 )
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+ALLOWED_ORIGINS = [
+    origin.strip() for origin in os.getenv('CORS_ORIGINS', '').split(',') if origin.strip()
+] or ["http://localhost"]
+
+# The service is normally only called server-to-server by the backend, so CORS
+# can be switched off entirely for trusted intra-cluster deployments
+if not _env_flag('DISABLE_CORS'):
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=ALLOWED_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["POST", "GET"],
+        allow_headers=["content-type"],
+    )
 
-vip_emails = os.getenv('VIP_EMAILS', '').split(',') if os.getenv('VIP_EMAILS') else []
-vip_sender_ids = os.getenv('VIP_SENDER_IDS', '').split(',') if os.getenv('VIP_SENDER_IDS') else []
+use_transformer_sentiment = _env_flag('USE_TRANSFORMER_SENTIMENT')
+use_zero_shot = _env_flag('USE_ZERO_SHOT', 'true')
+use_onnx_runtime = _env_flag('USE_ONNX_RUNTIME')
+quantize_zero_shot = _env_flag('QUANTIZE_ZERO_SHOT', 'true')
+use_torch_compile = _env_flag('TORCH_COMPILE')
+analysis_cache_size = int(os.getenv('ANALYSIS_CACHE_SIZE', '4096'))
+category_fast_confidence = float(os.getenv('CATEGORY_FAST_CONF', '0.9'))
+sentiment_fast_confidence = float(os.getenv('SENTIMENT_FAST_CONF', '0.2'))
+model_cache_size = int(os.getenv('MODEL_CACHE_SIZE', '10000'))
+near_duplicate_bits = int(os.getenv('NEAR_DUPLICATE_BITS', '0'))
 
-use_transformer_sentiment = os.getenv('USE_TRANSFORMER_SENTIMENT', 'false').lower() == 'true'
-use_zero_shot = os.getenv('USE_ZERO_SHOT', 'true').lower() == 'true'
+auto_tagger: Optional[AutoTagger] = None
+_init_logged = False
 
-try:
-    auto_tagger = AutoTagger(
-        use_transformer_sentiment=use_transformer_sentiment,
-        use_zero_shot_classification=use_zero_shot,
-        vip_emails=[email.strip() for email in vip_emails if email.strip()],
-        vip_sender_ids=[sender_id.strip() for sender_id in vip_sender_ids if sender_id.strip()]
-    )
-    logger.info("Auto-tagger initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing auto-tagger: {e}")
-    raise
+def _disable_grad():
+    """Turn off autograd in each worker thread (grad mode is thread-local)."""
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_grad_enabled(False)
+
+# Shared worker pool so CPU-bound analysis never blocks the event loop
+EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count(), initializer=_disable_grad)
+
+def _worker_count() -> int:
+    """Number of worker processes to launch from __main__."""
+    if os.getenv("ENV", "development") == "development":
+        return 1
+    return int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+
+def _serving_workers() -> int:
+    """Number of worker processes sharing this host's cores, however the server was launched."""
+    return int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+
+def _configure_torch():
+    """Tune PyTorch for inference-only serving, returning the module if available."""
+    try:
+        import torch
+    except ImportError:
+        return None
+
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, _serving_workers())))
+    torch.set_grad_enabled(False)
+    return torch
+
+def _compile_models(torch, tagger: AutoTagger):
+    # ONNX Runtime models are already graph-optimized and are not nn.Modules
+    sentiment_analyzer = tagger.sentiment_analyzer
+    if isinstance(sentiment_analyzer.transformer_model, torch.nn.Module):
+        sentiment_analyzer.transformer_model = torch.compile(sentiment_analyzer.transformer_model)
+
+    category_classifier = tagger.category_classifier
+    if isinstance(category_classifier.model, torch.nn.Module):
+        category_classifier.model = torch.compile(category_classifier.model)
+
+MAX_BATCH = int(os.getenv('MAX_BATCH', '16'))
+BATCH_WINDOW_MS = float(os.getenv('BATCH_WINDOW_MS', '5'))
+MAX_INFLIGHT_BATCHES = int(os.getenv('MAX_INFLIGHT_BATCHES', '1'))
+
+class BatchScheduler:
+    """Coalesces concurrent single-query requests into batched analysis calls."""
+
+    def __init__(self,
+                 process_batch: Callable[[List[Dict]], List[Dict]],
+                 max_batch: int = MAX_BATCH,
+                 window_ms: float = BATCH_WINDOW_MS,
+                 max_inflight: int = MAX_INFLIGHT_BATCHES):
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.max_inflight = max(1, max_inflight)
+        self.queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, item: Dict) -> Dict:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    def _drain(self, batch: List):
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+    async def _run(self):
+        while True:
+            # Wait for a free slot before forming a batch, so requests keep
+            # queueing (and batches grow) while the model is busy instead of
+            # oversubscribing the CPU with concurrent forward passes
+            await self._slots.acquire()
+            batch = [await self.queue.get()]
+            self._drain(batch)
+
+            # Give concurrent callers a short window to join this batch
+            if len(batch) < self.max_batch and self.window > 0:
+                await asyncio.sleep(self.window)
+                self._drain(batch)
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List):
+        try:
+            await self._process(batch)
+        finally:
+            self._slots.release()
+
+    async def _process(self, batch: List):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                EXECUTOR, self.process_batch, [item for item, _ in batch]
+            )
+        except Exception as e:
+            if len(batch) == 1:
+                _, future = batch[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+
+            # Retry one by one so a single bad query only fails its own request
+            logger.warning("Batched analysis of %d queries failed (%s); retrying individually", len(batch), e)
+            for item in batch:
+                await self._process([item])
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+batch_scheduler = BatchScheduler(lambda items: auto_tagger.analyze_many(items))
 
 class AnalyzeQueryRequest(BaseModel):
     text: str = Field(...)
@@ -82,11 +246,70 @@ class AnalyzeQueryResponse(BaseModel):
     keywords: List[str]
     urgency_keywords: Dict[str, List[str]]
 
+# Build validation schemas once at import instead of lazily on first request
+AnalyzeQueryRequest.model_rebuild()
+
 class HealthResponse(BaseModel):
     status: str
     service: str
     version: str
 
+class HealthCheckResponse(HealthResponse):
+    cache: Dict[str, int]
+
+@app.on_event("startup")
+async def startup():
+    global auto_tagger, _init_logged
+
+    torch = None
+    if use_transformer_sentiment or use_zero_shot:
+        torch = _configure_torch()
+
+    try:
+        auto_tagger = AutoTagger(
+            use_transformer_sentiment=use_transformer_sentiment,
+            use_zero_shot_classification=use_zero_shot,
+            use_onnx_runtime=use_onnx_runtime,
+            quantize_zero_shot=quantize_zero_shot,
+            vip_emails=_env_list('VIP_EMAILS', lowercase=True),
+            vip_sender_ids=_env_list('VIP_SENDER_IDS'),
+            cache_size=analysis_cache_size,
+            category_fast_confidence=category_fast_confidence,
+            sentiment_fast_confidence=sentiment_fast_confidence,
+            model_cache_size=model_cache_size,
+            near_duplicate_bits=near_duplicate_bits
+        )
+    except Exception as e:
+        logger.error("Error initializing auto-tagger: %s", e)
+        raise
+
+    if torch is not None and use_torch_compile:
+        _compile_models(torch, auto_tagger)
+
+    # Run one inference so weights, tokenizers and compiled graphs are resident
+    # before the first real request arrives. Requests would quietly fall back to
+    # keyword/VADER scoring if a model cannot run, so fail startup instead
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(EXECUTOR, auto_tagger.warmup)
+    except Exception as e:
+        logger.critical(
+            "Model warmup failed: %s. Fix the model setup or set USE_ZERO_SHOT=false / "
+            "USE_TRANSFORMER_SENTIMENT=false to serve keyword and VADER results only.",
+            e, exc_info=True
+        )
+        raise
+
+    if not _init_logged:
+        logger.info("Auto-tagger initialized successfully")
+        _init_logged = True
+
+    batch_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_batch_scheduler():
+    await batch_scheduler.stop()
+
 @app.get("/", response_model=HealthResponse)
 async def root():
     return {
@@ -95,47 +318,37 @@ async def root():
         "version": "1.0.0"
     }
 
-@app.get("/health", response_model=HealthResponse)
+@app.get("/health", response_model=HealthCheckResponse)
 async def health():
     return {
         "status": "healthy",
         "service": "query-tracking-ml-service",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "cache": auto_tagger.cache_info()
     }
 
-@app.post("/analyze", response_model=AnalyzeQueryResponse)
+# The analysis result is already well-typed, so return the response directly
+# (skipping validation and jsonable_encoder) and only document the schema
+@app.post("/analyze", responses={200: {"model": AnalyzeQueryResponse}})
 async def analyze_query(request: AnalyzeQueryRequest):
     try:
-        result = auto_tagger.analyze(
-            text=request.text,
-            subject=request.subject,
-            sender_email=request.sender_email,
-            sender_id=request.sender_id,
-            channel_type=request.channel_type
-        )
+        result = await batch_scheduler.submit(request.model_dump())
 
-        return AnalyzeQueryResponse(**result)
+        return MsgspecResponse(result)
     except Exception as e:
-        logger.error(f"Error analyzing query: {e}", exc_info=True)
+        logger.error("Error analyzing query: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
         raise HTTPException(status_code=500, detail=f"Error analyzing query: {str(e)}")
 
 @app.post("/analyze/batch")
 async def analyze_batch(requests: List[AnalyzeQueryRequest]):
     try:
-        results = []
-        for request in requests:
-            result = auto_tagger.analyze(
-                text=request.text,
-                subject=request.subject,
-                sender_email=request.sender_email,
-                sender_id=request.sender_id,
-                channel_type=request.channel_type
-            )
-            results.append(result)
+        loop = asyncio.get_running_loop()
+        items = [request.model_dump() for request in requests]
+        results = await loop.run_in_executor(EXECUTOR, auto_tagger.analyze_many, items)
 
-        return {"results": results, "count": len(results)}
+        return MsgspecResponse({"results": results, "count": len(results)})
     except Exception as e:
-        logger.error(f"Error in batch analysis: {e}", exc_info=True)
+        logger.error("Error in batch analysis: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
         raise HTTPException(status_code=500, detail=f"Error in batch analysis: {str(e)}")
 
 @app.get("/categories")
@@ -156,9 +369,37 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", 8001))
     host = os.getenv("HOST", "0.0.0.0")
 
-    uvicorn.run(
-        "api:app",
-        host=host,
-        port=port,
-        reload=os.getenv("ENV", "development") == "development"
-    )
+    if os.getenv("ENV", "development") == "development":
+        os.environ["WORKERS"] = "1"
+        uvicorn.run(
+            "api:app",
+            host=host,
+            port=port,
+            reload=True,
+            workers=1
+        )
+    else:
+        workers = _worker_count()
+
+        # Every worker loads its own copy of the models; on GPU keep CUDA contexts to a minimum
+        if use_transformer_sentiment or use_zero_shot:
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    workers = min(workers, 2)
+            except ImportError:
+                pass
+
+        # Worker processes inherit the environment and size their torch thread pools from it
+        os.environ["WORKERS"] = str(workers)
+
+        uvicorn.run(
+            "api:app",
+            host=host,
+            port=port,
+            loop="uvloop",
+            http="httptools",
+            workers=workers,
+            access_log=False,
+            log_level="warning"
+        )
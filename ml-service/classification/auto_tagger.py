@@ -1,31 +1,71 @@
-from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
 import logging
+import threading
 
 try:
-    from ..preprocessing.text_preprocessor import TextPreprocessor
+    from ..inference.fingerprint_cache import text_digest
+    from ..preprocessing.text_preprocessor import TextPreprocessor, PreparedText
     from ..sentiment.sentiment_analyzer import SentimentAnalyzer
 except ImportError:
-    from preprocessing.text_preprocessor import TextPreprocessor
+    from inference.fingerprint_cache import text_digest
+    from preprocessing.text_preprocessor import TextPreprocessor, PreparedText
     from sentiment.sentiment_analyzer import SentimentAnalyzer
 from .category_classifier import CategoryClassifier
 from .priority_scorer import PriorityScorer
 
 logger = logging.getLogger(__name__)
 
+# Tag strings for the closed label sets, built once instead of per request
+_SENTIMENT_TAGS = {label: f"sentiment_{label.lower()}" for label in ('POSITIVE', 'NEGATIVE', 'NEUTRAL')}
+_PRIORITY_TAGS = {level: f"priority_{level.lower()}" for level in PriorityScorer.PRIORITY_THRESHOLDS}
+_INTENT_TAGS = {
+    intent: f"intent_{intent}"
+    for intent in (*CategoryClassifier.INTENT_MAPPING.values(), 'general')
+}
+_URGENCY_TAGS = {category: f"urgency_{category}" for category, _ in TextPreprocessor.URGENCY_KEYWORDS}
+
 class AutoTagger:
     
     def __init__(self,
                  use_transformer_sentiment: bool = False,
                  use_zero_shot_classification: bool = True,
-                 vip_emails: Optional[List[str]] = None,
-                 vip_sender_ids: Optional[List[str]] = None):
+                 use_onnx_runtime: bool = False,
+                 quantize_zero_shot: bool = True,
+                 vip_emails: Optional[Iterable[str]] = None,
+                 vip_sender_ids: Optional[Iterable[str]] = None,
+                 cache_size: int = 4096,
+                 category_fast_confidence: float = 0.9,
+                 sentiment_fast_confidence: float = 0.2,
+                 model_cache_size: int = 10000,
+                 near_duplicate_bits: int = 0):
         self.preprocessor = TextPreprocessor()
-        self.sentiment_analyzer = SentimentAnalyzer(use_transformer=use_transformer_sentiment)
-        self.category_classifier = CategoryClassifier(use_zero_shot=use_zero_shot_classification)
+        self.sentiment_analyzer = SentimentAnalyzer(
+            use_transformer=use_transformer_sentiment,
+            use_onnx=use_onnx_runtime,
+            cache_size=model_cache_size,
+            near_duplicate_bits=near_duplicate_bits,
+            fast_confidence=sentiment_fast_confidence
+        )
+        self.category_classifier = CategoryClassifier(
+            use_zero_shot=use_zero_shot_classification,
+            use_onnx=use_onnx_runtime,
+            quantize=quantize_zero_shot,
+            cache_size=model_cache_size,
+            near_duplicate_bits=near_duplicate_bits,
+            fast_confidence=category_fast_confidence
+        )
         self.priority_scorer = PriorityScorer(
             vip_emails=vip_emails,
             vip_sender_ids=vip_sender_ids
         )
+        
+        # LRU cache of analysis results for repeated queries
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
     
     def analyze(self,
                 text: str,
@@ -34,49 +74,218 @@ class AutoTagger:
                 channel_type: Optional[str] = None,
                 subject: Optional[str] = None) -> Dict:
         if not text or len(text.strip()) == 0:
-            return {
-                'category': 'question',
-                'category_confidence': 0.0,
-                'category_scores': {},
-                'sentiment': 'NEUTRAL',
-                'sentiment_confidence': 0.0,
-                'sentiment_scores': {'positive': 0.0, 'neutral': 1.0, 'negative': 0.0},
-                'intent': 'general',
-                'priority': 'MEDIUM',
-                'priority_score': 0.5,
-                'is_urgent': False,
-                'is_vip': False,
-                'auto_tags': [],
-                'keywords': []
-            }
+            return self._empty_result()
+        
+        cache_key = self._cache_key(text, subject, sender_email, sender_id, channel_type)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
         
         full_text = text
         if subject:
             full_text = f"{subject} {text}"
         
-        cleaned_text = self.preprocessor.clean_text(full_text)
-        
-        keywords = self.preprocessor.extract_keywords(cleaned_text)
-        
-        urgency_keywords = self.preprocessor.detect_urgency_keywords(cleaned_text)
+        prepared = self.preprocessor.prepare(full_text)
         
-        sentiment_result = self.sentiment_analyzer.analyze(cleaned_text)
+        sentiment_result = self.sentiment_analyzer.analyze(prepared.cleaned)
         
-        category, category_confidence, category_scores = self.category_classifier.classify(cleaned_text)
+        category_result = self.category_classifier.classify(prepared.cleaned)
         
-        intent = self.category_classifier.get_intent(cleaned_text)
-        
-        priority, priority_score, is_urgent = self.priority_scorer.classify_priority(
-            text=cleaned_text,
+        priority_result = self.priority_scorer.classify_priority(
+            text=prepared,
             sentiment=sentiment_result['sentiment'],
             sentiment_confidence=sentiment_result['confidence'],
-            category=category,
+            category=category_result[0],
             sender_email=sender_email,
             sender_id=sender_id,
             channel_type=channel_type
         )
         
-        is_vip = self.priority_scorer.check_vip_status(sender_email, sender_id)
+        result = self._build_result(
+            prepared=prepared,
+            sentiment_result=sentiment_result,
+            category_result=category_result,
+            priority_result=priority_result
+        )
+        self._cache_put(cache_key, result)
+        
+        return result
+    
+    def analyze_many(self, items: List[Dict]) -> List[Dict]:
+        """
+        Analyze several queries at once, batching the model calls.
+        
+        Args:
+            items: Dicts with the same keys accepted by analyze()
+        
+        Returns:
+            List of analysis results in input order
+        """
+        results = [None] * len(items)
+        pending = []
+        pending_keys = {}
+        duplicates = []
+        
+        for index, item in enumerate(items):
+            text = item.get('text')
+            if not text or len(text.strip()) == 0:
+                results[index] = self._empty_result()
+                continue
+            
+            cache_key = self._cache_key(
+                text,
+                item.get('subject'),
+                item.get('sender_email'),
+                item.get('sender_id'),
+                item.get('channel_type')
+            )
+            if cache_key in pending_keys:
+                duplicates.append((index, pending_keys[cache_key]))
+                continue
+            
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending_keys[cache_key] = index
+                pending.append((index, cache_key))
+        
+        if pending:
+            prepared_texts = []
+            for index, _ in pending:
+                item = items[index]
+                full_text = item['text']
+                if item.get('subject'):
+                    full_text = f"{item['subject']} {full_text}"
+                prepared_texts.append(self.preprocessor.prepare(full_text))
+            
+            cleaned_texts = [prepared.cleaned for prepared in prepared_texts]
+            sentiment_results = self.sentiment_analyzer.analyze_batch(cleaned_texts)
+            category_results = self.category_classifier.classify_batch(cleaned_texts)
+            
+            priority_results = self.priority_scorer.classify_priority_batch([
+                {
+                    'text': prepared,
+                    'sentiment': sentiment_result['sentiment'],
+                    'sentiment_confidence': sentiment_result['confidence'],
+                    'category': category_result[0],
+                    'sender_email': items[index].get('sender_email'),
+                    'sender_id': items[index].get('sender_id'),
+                    'channel_type': items[index].get('channel_type')
+                }
+                for (index, _), prepared, sentiment_result, category_result in zip(
+                    pending, prepared_texts, sentiment_results, category_results)
+            ])
+            
+            for (index, cache_key), prepared, sentiment_result, category_result, priority_result in zip(
+                    pending, prepared_texts, sentiment_results, category_results, priority_results):
+                results[index] = self._build_result(
+                    prepared=prepared,
+                    sentiment_result=sentiment_result,
+                    category_result=category_result,
+                    priority_result=priority_result
+                )
+                self._cache_put(cache_key, results[index])
+        
+        for index, source_index in duplicates:
+            results[index] = self._copy_result(results[source_index])
+        
+        return results
+    
+    def warmup(self, text: str = "warmup query please ignore"):
+        """
+        Run every loaded model once, then a full analysis.
+        
+        Unlike analyze(), model errors are raised here rather than answered by
+        the keyword and VADER fallbacks, so a model that loaded but cannot run
+        is caught at startup.
+        """
+        self.category_classifier.warmup(text)
+        self.sentiment_analyzer.warmup(text)
+        self.analyze(text)
+    
+    def cache_info(self) -> Dict[str, int]:
+        """Return hit/miss statistics for the analysis cache."""
+        with self._cache_lock:
+            return {
+                'hits': self._cache_hits,
+                'misses': self._cache_misses,
+                'maxsize': self.cache_size,
+                'currsize': len(self._cache)
+            }
+    
+    def _cache_key(self,
+                   text: str,
+                   subject: Optional[str],
+                   sender_email: Optional[str],
+                   sender_id: Optional[str],
+                   channel_type: Optional[str]) -> Tuple:
+        return (text_digest(text), subject, sender_email, sender_id, channel_type)
+    
+    def _cache_get(self, key: Tuple) -> Optional[Dict]:
+        if self.cache_size <= 0:
+            return None
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is None:
+                self._cache_misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self._cache_hits += 1
+        return self._copy_result(result)
+    
+    def _cache_put(self, key: Tuple, result: Dict):
+        if self.cache_size <= 0:
+            return
+        result = self._copy_result(result)
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    @staticmethod
+    def _copy_result(result: Dict) -> Dict:
+        """Copy the mutable containers of a result so cached entries stay untouched."""
+        copied = dict(result)
+        for key, value in result.items():
+            if isinstance(value, list):
+                copied[key] = list(value)
+            elif isinstance(value, dict):
+                copied[key] = {k: list(v) if isinstance(v, list) else v for k, v in value.items()}
+        return copied
+    
+    def _empty_result(self) -> Dict:
+        return {
+            'category': 'question',
+            'category_confidence': 0.0,
+            'category_scores': {},
+            'sentiment': 'NEUTRAL',
+            'sentiment_confidence': 0.0,
+            'sentiment_scores': {'positive': 0.0, 'neutral': 1.0, 'negative': 0.0},
+            'intent': 'general',
+            'priority': 'MEDIUM',
+            'priority_score': 0.5,
+            'is_urgent': False,
+            'is_vip': False,
+            'auto_tags': [],
+            'keywords': []
+        }
+    
+    def _build_result(self,
+                      prepared: PreparedText,
+                      sentiment_result: Dict,
+                      category_result: Tuple[str, float, Dict[str, float]],
+                      priority_result: Tuple[str, float, bool, bool]) -> Dict:
+        keywords = self.preprocessor.extract_keywords(prepared)
+        
+        urgency_keywords = self.preprocessor.detect_urgency_keywords(prepared)
+        
+        category, category_confidence, category_scores = category_result
+        
+        intent = self.category_classifier.get_intent_for_category(category)
+        
+        priority, priority_score, is_urgent, is_vip = priority_result
         
         auto_tags = self._generate_tags(
             category=category,
@@ -117,19 +326,18 @@ class AutoTagger:
                       intent: str,
                       is_vip: bool,
                       is_urgent: bool) -> List[str]:
-        tags = []
+        tags = [
+            category,
+            _SENTIMENT_TAGS.get(sentiment) or f"sentiment_{sentiment.lower()}",
+            _PRIORITY_TAGS.get(priority) or f"priority_{priority.lower()}",
+            _INTENT_TAGS.get(intent) or f"intent_{intent}"
+        ]
         
-        tags.append(category)
-        
-        tags.append(f"sentiment_{sentiment.lower()}")
-        
-        tags.append(f"priority_{priority.lower()}")
-        
-        tags.append(f"intent_{intent}")
-        
-        for category_type, keywords in urgency_keywords.items():
-            if keywords:
-                tags.append(f"urgency_{category_type}")
+        tags.extend(
+            _URGENCY_TAGS.get(category_type) or f"urgency_{category_type}"
+            for category_type, keywords in urgency_keywords.items()
+            if keywords
+        )
         
         if is_vip:
             tags.append('vip')
@@ -9,15 +9,34 @@ logger = logging.getLogger(__name__)
 
 # Try to import transformers (optional - will use keyword-based if unavailable)
 try:
-    from transformers import pipeline
+    import torch
+    import transformers
     TRANSFORMERS_AVAILABLE = True
 except ImportError as e:
-    logger.warning(f"Transformers not available: {e}. Will use keyword-based classification only.")
+    logger.warning("Transformers not available: %s. Will use keyword-based classification only.", e)
     TRANSFORMERS_AVAILABLE = False
 except Exception as e:
-    logger.warning(f"Error importing transformers (may need Visual C++ Redistributable): {e}. Will use keyword-based classification only.")
+    logger.warning("Error importing transformers (may need Visual C++ Redistributable): %s. Will use keyword-based classification only.", e)
     TRANSFORMERS_AVAILABLE = False
 
+try:
+    from ..inference.fingerprint_cache import FingerprintCache
+    from ..inference.model_loader import load_sequence_classifier
+    from ..inference.precision import autocast_for
+    from ..preprocessing.keyword_index import CATEGORY_KEYWORDS, scan as scan_keywords
+except ImportError:
+    from inference.fingerprint_cache import FingerprintCache
+    from inference.model_loader import load_sequence_classifier
+    from inference.precision import autocast_for
+    from preprocessing.keyword_index import CATEGORY_KEYWORDS, scan as scan_keywords
+
+def _find_sublist(values: List[int], part: List[int], start: int) -> int:
+    """Index of the first occurrence of part in values at or after start, or -1."""
+    for index in range(start, len(values) - len(part) + 1):
+        if values[index:index + len(part)] == part:
+            return index
+    return -1
+
 class CategoryClassifier:
     """Category classification using pre-trained transformer models."""
     
@@ -34,10 +53,42 @@ class CategoryClassifier:
         'feedback'
     ]
     
+    # Map categories to intents
+    INTENT_MAPPING = {
+        'question': 'information_seeking',
+        'request': 'action_request',
+        'complaint': 'issue_reporting',
+        'compliment': 'positive_feedback',
+        'bug_report': 'technical_issue',
+        'feature_request': 'product_improvement',
+        'support_request': 'help_needed',
+        'purchase_inquiry': 'sales_interest',
+        'feedback': 'general_feedback'
+    }
+    
+    # Keyword patterns for each category, used by the keyword-based fallback
+    KEYWORD_PATTERNS = CATEGORY_KEYWORDS
+    
+    ZERO_SHOT_MODEL = "facebook/bart-large-mnli"
+    
+    # Token limit per premise/hypothesis pair; queries rarely need more
+    MAX_LENGTH = 256
+    
+    # Same hypothesis template the HF zero-shot pipeline uses by default
+    HYPOTHESIS_TEMPLATE = "This example is {}."
+    
+    # Premises per forward pass; each one expands to a pair per category
+    BATCH_SIZE = 32
+    
     def __init__(self, 
                  categories: Optional[List[str]] = None,
                  model_name: str = "distilbert-base-uncased",
-                 use_zero_shot: bool = True):
+                 use_zero_shot: bool = True,
+                 use_onnx: bool = False,
+                 quantize: bool = True,
+                 cache_size: int = 10000,
+                 near_duplicate_bits: int = 0,
+                 fast_confidence: float = 0.9):
         """
         Initialize category classifier.
         
@@ -45,22 +96,26 @@ class CategoryClassifier:
             categories: List of categories to classify into
             model_name: Name of transformer model to use
             use_zero_shot: If True, use zero-shot classification (no training needed)
+            use_onnx: If True, run the zero-shot model as an int8 quantized ONNX Runtime model
+            quantize: If True, dynamically quantize the PyTorch zero-shot model's Linear layers to int8 (CPU only)
+            cache_size: Number of zero-shot results kept for repeated texts (0 disables the cache)
+            near_duplicate_bits: SimHash distance within which a cached result is reused (0 for exact text only)
+            fast_confidence: Keyword confidence at or above which the zero-shot model is skipped
         """
         self.categories = categories or self.DEFAULT_CATEGORIES
         self.use_zero_shot = use_zero_shot
-        self.classifier = None
+        self.fast_confidence = fast_confidence
         self.tokenizer = None
         self.model = None
+        self.zero_shot_cache = FingerprintCache(maxsize=cache_size, near_duplicate_bits=near_duplicate_bits)
         
         if use_zero_shot and TRANSFORMERS_AVAILABLE:
             try:
-                self.classifier = pipeline(
-                    "zero-shot-classification",
-                    model="facebook/bart-large-mnli"
-                )
+                self.tokenizer, self.model = load_sequence_classifier(self.ZERO_SHOT_MODEL, use_onnx, quantize)
+                self._prepare_hypotheses()
                 logger.info("Zero-shot classification model loaded successfully")
             except Exception as e:
-                logger.warning(f"Could not load zero-shot model: {e}. Using keyword-based classification.")
+                logger.warning("Could not load zero-shot model: %s. Using keyword-based classification.", e)
                 self.use_zero_shot = False
         elif use_zero_shot and not TRANSFORMERS_AVAILABLE:
             logger.info("Transformers not available. Using keyword-based classification.")
@@ -69,6 +124,138 @@ class CategoryClassifier:
             # For fine-tuned models, you would load your trained model here
             pass
     
+    def _prepare_hypotheses(self):
+        """
+        Tokenize the fixed hypothesis for every category once, up front.
+        
+        The special tokens the tokenizer places around a premise/hypothesis pair
+        are read from one encoded sample pair, so premises can later be spliced
+        in front of the cached hypothesis ids without re-tokenizing them.
+        """
+        hypotheses = [
+            self.tokenizer.encode(self.HYPOTHESIS_TEMPLATE.format(category), add_special_tokens=False)
+            for category in self.categories
+        ]
+        sample_premise = self.tokenizer.encode("premise", add_special_tokens=False)
+        sample = self.tokenizer("premise", self.HYPOTHESIS_TEMPLATE.format(self.categories[0]))
+        
+        input_ids = list(sample['input_ids'])
+        token_types = list(sample.get('token_type_ids') or [0] * len(input_ids))
+        premise_start = _find_sublist(input_ids, sample_premise, 0)
+        premise_end = premise_start + len(sample_premise)
+        hypothesis_start = _find_sublist(input_ids, hypotheses[0], premise_end)
+        if premise_start < 0 or hypothesis_start < 0:
+            raise ValueError("Could not locate premise and hypothesis in an encoded sample pair")
+        hypothesis_end = hypothesis_start + len(hypotheses[0])
+        
+        self._use_token_types = 'token_type_ids' in self.tokenizer.model_input_names
+        self._pair_prefix = input_ids[:premise_start]
+        self._pair_prefix_types = token_types[:premise_start]
+        self._premise_type = token_types[premise_start]
+        
+        # Everything after the premise: separator, hypothesis and closing tokens
+        separator = input_ids[premise_end:hypothesis_start]
+        separator_types = token_types[premise_end:hypothesis_start]
+        suffix = input_ids[hypothesis_end:]
+        suffix_types = token_types[hypothesis_end:]
+        hypothesis_type = token_types[hypothesis_start]
+        self._hypothesis_tails = [separator + ids + suffix for ids in hypotheses]
+        self._hypothesis_tail_types = [
+            separator_types + [hypothesis_type] * len(ids) + suffix_types for ids in hypotheses
+        ]
+        
+        self._entailment_id = next(
+            (index for label, index in self.model.config.label2id.items() if label.lower().startswith('entail')),
+            -1
+        )
+        self._max_premise_length = (
+            min(self.tokenizer.model_max_length, self.MAX_LENGTH)
+            - len(self._pair_prefix)
+            - max(len(tail) for tail in self._hypothesis_tails)
+        )
+    
+    def _pair_features(self, texts: List[str]) -> List[Dict[str, List[int]]]:
+        """
+        Build the premise/hypothesis pair for every text and category.
+        
+        Only the premises are tokenized here; each one is joined to the cached
+        hypothesis ids, giving the same ids as encoding each pair in full.
+        
+        Args:
+            texts: Premise texts
+        
+        Returns:
+            Unpadded model inputs, one per (text, category) pair, grouped by text
+        """
+        premise_ids = self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self._max_premise_length
+        )['input_ids']
+        
+        features = []
+        for premise in premise_ids:
+            head = self._pair_prefix + premise
+            head_types = self._pair_prefix_types + [self._premise_type] * len(premise)
+            for tail, tail_types in zip(self._hypothesis_tails, self._hypothesis_tail_types):
+                feature = {'input_ids': head + tail}
+                if self._use_token_types:
+                    feature['token_type_ids'] = head_types + tail_types
+                features.append(feature)
+        return features
+    
+    def _zero_shot(self, texts: List[str]) -> List[Dict]:
+        """
+        Score premises against every category in one forward pass.
+        
+        Args:
+            texts: Premise texts
+        
+        Returns:
+            List of {'labels', 'scores'} dicts sorted by score, one per text
+        """
+        features = self._pair_features(texts)
+        
+        # Pad only to the longest pair in this call, not to the model maximum
+        batch = self.tokenizer.pad(features, padding='longest', return_tensors='pt')
+        batch = {key: value.to(self.model.device) for key, value in batch.items()}
+        
+        with torch.inference_mode(), autocast_for(self.model):
+            logits = self.model(**batch).logits
+        
+        entail_logits = logits[:, self._entailment_id].reshape(len(texts), len(self.categories))
+        probabilities = entail_logits.float().softmax(dim=-1).tolist()
+        
+        results = []
+        for scores in probabilities:
+            ranked = sorted(zip(self.categories, scores), key=lambda pair: pair[1], reverse=True)
+            results.append({
+                'labels': [label for label, _ in ranked],
+                'scores': [score for _, score in ranked]
+            })
+        return results
+    
+    def warmup(self, text: str):
+        """
+        Run the zero-shot model once, raising on failure instead of falling back to keywords.
+        
+        Args:
+            text: Premise to score
+        """
+        if self.use_zero_shot and self.model is not None:
+            self._zero_shot([text])
+    
+    def _zero_shot_cached(self, texts: List[str]) -> List[Dict]:
+        """Zero-shot results for texts, running the model in batches only for uncached texts."""
+        return self.zero_shot_cache.get_or_compute(texts, self._zero_shot_batched)
+    
+    def _zero_shot_batched(self, texts: List[str]) -> List[Dict]:
+        results = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            results.extend(self._zero_shot(texts[start:start + self.BATCH_SIZE]))
+        return results
+    
     def classify_zero_shot(self, text: str) -> Tuple[str, float, Dict[str, float]]:
         """
         Classify text using zero-shot classification.
@@ -86,17 +273,21 @@ class CategoryClassifier:
             # Limit text length for transformer
             text_truncated = text[:512]
             
-            result = self.classifier(text_truncated, self.categories)
-            
-            predicted_label = result['labels'][0]
-            confidence = result['scores'][0]
-            all_scores = dict(zip(result['labels'], result['scores']))
+            result = self._zero_shot_cached([text_truncated])[0]
             
-            return (predicted_label, confidence, all_scores)
+            return self._format_zero_shot_result(result)
         except Exception as e:
-            logger.error(f"Error in zero-shot classification: {e}")
+            logger.error("Error in zero-shot classification: %s", e)
             return self.classify_keyword_based(text)
     
+    def _format_zero_shot_result(self, result: Dict) -> Tuple[str, float, Dict[str, float]]:
+        """Convert a zero-shot result into (category, confidence, scores)."""
+        predicted_label = result['labels'][0]
+        confidence = result['scores'][0]
+        all_scores = dict(zip(result['labels'], result['scores']))
+        
+        return (predicted_label, confidence, all_scores)
+    
     def classify_keyword_based(self, text: str) -> Tuple[str, float, Dict[str, float]]:
         """
         Fallback keyword-based classification.
@@ -108,27 +299,14 @@ class CategoryClassifier:
             Tuple of (predicted_category, confidence, all_scores)
         """
         text_lower = text.lower()
-        
-        # Keyword patterns for each category
-        keyword_patterns = {
-            'question': ['how', 'what', 'when', 'where', 'why', 'who', 'can', 'could', 'would', 'should', '?'],
-            'complaint': ['complaint', 'unhappy', 'disappointed', 'frustrated', 'angry', 'terrible', 'worst', 'awful', 'horrible', 'bad'],
-            'compliment': ['great', 'excellent', 'awesome', 'amazing', 'love', 'thank', 'thanks', 'appreciate', 'good job'],
-            'bug_report': ['bug', 'error', 'broken', 'not working', 'issue', 'problem', 'crash', 'failed', 'failure'],
-            'feature_request': ['feature', 'add', 'suggestion', 'wish', 'would like', 'could you', 'please add'],
-            'request': ['request', 'need', 'want', 'require', 'looking for', 'interested in'],
-            'support_request': ['help', 'support', 'assist', 'guidance', 'trouble', 'difficulty'],
-            'purchase_inquiry': ['price', 'cost', 'buy', 'purchase', 'order', 'payment', 'shipping', 'delivery'],
-            'feedback': ['feedback', 'opinion', 'thought', 'suggest', 'improve', 'better']
-        }
+        hits = scan_keywords(text_lower)
         
         scores = {}
         max_score = 0
         predicted_category = 'question'  # Default
         
-        for category, keywords in keyword_patterns.items():
-            matches = sum(1 for keyword in keywords if keyword in text_lower)
-            score = matches / len(keywords) if keywords else 0
+        for category, keywords in self.KEYWORD_PATTERNS.items():
+            score = hits.count('category', category) / len(keywords) if keywords else 0
             scores[category] = score
             
             if score > max_score:
@@ -140,20 +318,87 @@ class CategoryClassifier:
         
         return (predicted_category, confidence, scores)
     
+    def fast_classify(self, text: str) -> Tuple[str, float, Dict[str, float]]:
+        """
+        Cheap lexical classification used to skip the transformer on clear-cut text.
+        
+        Args:
+            text: Input text to classify
+        
+        Returns:
+            Tuple of (predicted_category, confidence, all_scores)
+        """
+        return self.classify_keyword_based(text)
+    
     def classify(self, text: str) -> Tuple[str, float, Dict[str, float]]:
         """
         Classify text into a category.
         
+        The keyword heuristic runs first; only texts it is unsure about are
+        sent to the zero-shot model.
+        
         Args:
             text: Input text to classify
         
         Returns:
             Tuple of (predicted_category, confidence, all_scores)
         """
-        if self.use_zero_shot and self.classifier:
+        result = self.fast_classify(text)
+        if self.use_zero_shot and self.model is not None and result[1] < self.fast_confidence:
             return self.classify_zero_shot(text)
-        else:
-            return self.classify_keyword_based(text)
+        return result
+    
+    def classify_batch(self, texts: List[str]) -> List[Tuple[str, float, Dict[str, float]]]:
+        """
+        Classify several texts, escalating only uncertain ones to batched zero-shot model calls.
+        
+        Args:
+            texts: Input texts to classify
+        
+        Returns:
+            List of (predicted_category, confidence, all_scores) tuples in input order
+        """
+        results = [self.fast_classify(text) for text in texts]
+        
+        if not (self.use_zero_shot and self.model is not None):
+            return results
+        
+        uncertain = [index for index, (_, confidence, _) in enumerate(results)
+                     if confidence < self.fast_confidence]
+        if uncertain:
+            model_results = self._classify_zero_shot_batch([texts[index] for index in uncertain])
+            for index, result in zip(uncertain, model_results):
+                results[index] = result
+        
+        return results
+    
+    def _classify_zero_shot_batch(self, texts: List[str]) -> List[Tuple[str, float, Dict[str, float]]]:
+        """Zero-shot classify several texts, falling back to keywords if the model fails."""
+        results = [None] * len(texts)
+        pending = []
+        
+        for index, text in enumerate(texts):
+            if not text or len(text.strip()) == 0:
+                results[index] = ('question', 0.0, {})
+            else:
+                pending.append(index)
+        
+        if not pending:
+            return results
+        
+        try:
+            # Limit text length for transformer
+            batch = [texts[index][:512] for index in pending]
+            outputs = self._zero_shot_cached(batch)
+            
+            for index, result in zip(pending, outputs):
+                results[index] = self._format_zero_shot_result(result)
+        except Exception as e:
+            logger.error("Error in batched zero-shot classification: %s", e)
+            for index in pending:
+                results[index] = self.classify_keyword_based(texts[index])
+        
+        return results
     
     def get_intent(self, text: str) -> str:
         """
@@ -167,19 +412,16 @@ class CategoryClassifier:
         """
         category, _, _ = self.classify(text)
         
-        # Map categories to intents
-        intent_mapping = {
-            'question': 'information_seeking',
-            'request': 'action_request',
-            'complaint': 'issue_reporting',
-            'compliment': 'positive_feedback',
-            'bug_report': 'technical_issue',
-            'feature_request': 'product_improvement',
-            'support_request': 'help_needed',
-            'purchase_inquiry': 'sales_interest',
-            'feedback': 'general_feedback'
-        }
-        
-        return intent_mapping.get(category, 'general')
-
-
+        return self.get_intent_for_category(category)
+    
+    def get_intent_for_category(self, category: str) -> str:
+        """
+        Map an already classified category to its intent.
+        
+        Args:
+            category: Category returned by classify()
+        
+        Returns:
+            Intent string
+        """
+        return self.INTENT_MAPPING.get(category, 'general')
@@ -2,10 +2,18 @@
 Priority scoring algorithm for query prioritization.
 Determines priority level (CRITICAL, HIGH, MEDIUM, LOW) based on multiple factors.
 """
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 import re
 from datetime import datetime
 import logging
+import numpy as np
+
+try:
+    from ..preprocessing.keyword_index import PRIORITY_KEYWORDS, scan as scan_keywords
+    from ..preprocessing.text_preprocessor import PreparedText
+except ImportError:
+    from preprocessing.keyword_index import PRIORITY_KEYWORDS, scan as scan_keywords
+    from preprocessing.text_preprocessor import PreparedText
 
 logger = logging.getLogger(__name__)
 
@@ -20,54 +28,83 @@ class PriorityScorer:
         'LOW': 0.0
     }
     
-    def __init__(self, vip_emails: Optional[List[str]] = None, vip_sender_ids: Optional[List[str]] = None):
+    # Boost added for VIP senders
+    VIP_SCORE = 0.3
+    
+    # Priority contribution of each category
+    _CATEGORY_WEIGHTS = {
+        'bug_report': 0.3,
+        'complaint': 0.25,
+        'support_request': 0.2,
+        'question': 0.1,
+        'compliment': 0.0,
+        'feedback': 0.05,
+        'feature_request': 0.1,
+        'purchase_inquiry': 0.15,
+        'request': 0.15
+    }
+    
+    # Priority contribution of each channel (some channels are more urgent)
+    _CHANNEL_WEIGHTS = {
+        'WEBSITE_CHAT': 0.2,  # Real-time chat is more urgent
+        'EMAIL': 0.1,
+        'TWITTER': 0.15,  # Public visibility
+        'FACEBOOK': 0.1,
+        'INSTAGRAM': 0.1,
+        'LINKEDIN': 0.1,
+        'DISCORD': 0.15,
+        'SLACK': 0.15,
+        'TEAMS': 0.15,
+        'WHATSAPP': 0.15
+    }
+    
+    def __init__(self, vip_emails: Optional[Iterable[str]] = None, vip_sender_ids: Optional[Iterable[str]] = None):
         """
         Initialize priority scorer.
         
         Args:
-            vip_emails: List of VIP customer email addresses
-            vip_sender_ids: List of VIP customer sender IDs
+            vip_emails: VIP customer email addresses
+            vip_sender_ids: VIP customer sender IDs
         """
-        self.vip_emails = set(vip_emails or [])
-        self.vip_sender_ids = set(vip_sender_ids or [])
+        # Emails are compared case-insensitively, so canonicalize them once here
+        self.vip_emails = frozenset(email.lower() for email in (vip_emails or ()))
+        self.vip_sender_ids = frozenset(vip_sender_ids or ())
         
         # Urgency keywords with weights
         self.urgency_keywords = {
-            'critical': {
-                'keywords': ['urgent', 'critical', 'emergency', 'asap', 'immediately', 'now', 'crisis', 'down', 'broken', 'not working'],
-                'weight': 0.5
-            },
-            'high': {
-                'keywords': ['important', 'soon', 'quickly', 'priority', 'needed', 'required', 'issue', 'problem'],
-                'weight': 0.3
-            },
-            'negative': {
-                'keywords': ['angry', 'frustrated', 'disappointed', 'terrible', 'worst', 'awful', 'unacceptable'],
-                'weight': 0.2
-            }
+            'critical': {'keywords': PRIORITY_KEYWORDS['critical'], 'weight': 0.5},
+            'high': {'keywords': PRIORITY_KEYWORDS['high'], 'weight': 0.3},
+            'negative': {'keywords': PRIORITY_KEYWORDS['negative'], 'weight': 0.2}
         }
         
         # Negative sentiment weight
         self.negative_sentiment_weight = 0.2
+        
+        # Weight of each factor in the priority score:
+        # VIP, urgency keywords, sentiment, category, channel, length
+        self.feature_weights = np.ones(6)
     
     def check_vip_status(self, sender_email: Optional[str] = None, sender_id: Optional[str] = None) -> bool:
         """Check if sender is a VIP customer."""
-        if sender_email and sender_email.lower() in self.vip_emails:
-            return True
-        if sender_id and sender_id in self.vip_sender_ids:
-            return True
-        return False
-    
-    def score_urgency_keywords(self, text: str) -> float:
-        """Score based on urgency keywords in text."""
-        text_lower = text.lower()
+        return bool(
+            (sender_email and sender_email.lower() in self.vip_emails)
+            or (sender_id and sender_id in self.vip_sender_ids)
+        )
+    
+    def score_urgency_keywords(self, text: Union[str, PreparedText]) -> float:
+        """Score based on urgency keywords in text (or already prepared text)."""
+        if isinstance(text, PreparedText):
+            text_lower = text.lowered
+        else:
+            text_lower = text.lower()
+        hits = scan_keywords(text_lower)
         total_score = 0.0
         
         for level, config in self.urgency_keywords.items():
             keywords = config['keywords']
             weight = config['weight']
             
-            matches = sum(1 for keyword in keywords if keyword in text_lower)
+            matches = hits.count('priority', level)
             if matches > 0:
                 # Score increases with number of matches (capped)
                 match_score = min(matches / len(keywords), 1.0)
@@ -86,38 +123,19 @@ class PriorityScorer:
     
     def score_category(self, category: str) -> float:
         """Score based on category type."""
-        category_weights = {
-            'bug_report': 0.3,
-            'complaint': 0.25,
-            'support_request': 0.2,
-            'question': 0.1,
-            'compliment': 0.0,
-            'feedback': 0.05,
-            'feature_request': 0.1,
-            'purchase_inquiry': 0.15,
-            'request': 0.15
-        }
-        return category_weights.get(category, 0.1)
+        return self._CATEGORY_WEIGHTS.get(category, 0.1)
     
     def score_channel(self, channel_type: Optional[str] = None) -> float:
         """Score based on channel type (some channels are more urgent)."""
-        channel_weights = {
-            'WEBSITE_CHAT': 0.2,  # Real-time chat is more urgent
-            'EMAIL': 0.1,
-            'TWITTER': 0.15,  # Public visibility
-            'FACEBOOK': 0.1,
-            'INSTAGRAM': 0.1,
-            'LINKEDIN': 0.1,
-            'DISCORD': 0.15,
-            'SLACK': 0.15,
-            'TEAMS': 0.15,
-            'WHATSAPP': 0.15
-        }
-        return channel_weights.get(channel_type, 0.1) if channel_type else 0.1
+        return self._CHANNEL_WEIGHTS.get(channel_type, 0.1) if channel_type else 0.1
     
-    def score_length(self, text: str) -> float:
+    def score_length(self, text: Union[str, PreparedText]) -> float:
         """Very long or very short messages might indicate urgency."""
-        word_count = len(text.split())
+        if isinstance(text, PreparedText):
+            word_count = text.word_count
+        else:
+            # Approximate count from separators; only the extremes matter here
+            word_count = sum(text.count(separator) for separator in ' \t\n') + 1 if text else 0
         
         # Extremely short (< 5 words) or extremely long (> 200 words) might indicate urgency
         if word_count < 5:
@@ -128,7 +146,7 @@ class PriorityScorer:
             return 0.0
     
     def calculate_priority_score(self,
-                                 text: str,
+                                 text: Union[str, PreparedText],
                                  sentiment: str = 'NEUTRAL',
                                  sentiment_confidence: float = 0.0,
                                  category: str = 'question',
@@ -140,7 +158,7 @@ class PriorityScorer:
         Calculate overall priority score (0.0 to 1.0).
         
         Args:
-            text: Query content
+            text: Query content, or the PreparedText built for it
             sentiment: Sentiment classification
             sentiment_confidence: Confidence of sentiment analysis
             category: Category classification
@@ -152,40 +170,54 @@ class PriorityScorer:
         Returns:
             Priority score between 0.0 and 1.0
         """
-        scores = []
-        
-        # Check VIP status
-        if is_vip is None:
-            is_vip = self.check_vip_status(sender_email, sender_id)
-        
-        if is_vip:
-            scores.append(0.3)  # VIP customers get priority boost
-        
-        # Urgency keywords
-        urgency_score = self.score_urgency_keywords(text)
-        scores.append(urgency_score)
-        
-        # Sentiment
-        sentiment_score = self.score_sentiment(sentiment, sentiment_confidence)
-        scores.append(sentiment_score)
+        features = self._score_features(
+            text, sentiment, sentiment_confidence, category,
+            sender_email, sender_id, channel_type, is_vip
+        )
         
-        # Category
-        category_score = self.score_category(category)
-        scores.append(category_score)
+        # Combine scores (weighted sum, capped at 1.0)
+        return float(min((np.asarray(features) * self.feature_weights).sum(), 1.0))
+    
+    def score_batch(self, rows: List[Dict]) -> np.ndarray:
+        """
+        Calculate priority scores for several queries in one vectorized pass.
         
-        # Channel
-        channel_score = self.score_channel(channel_type)
-        scores.append(channel_score)
+        Args:
+            rows: Keyword arguments of calculate_priority_score, one dict per query
         
-        # Length
-        length_score = self.score_length(text)
-        scores.append(length_score)
+        Returns:
+            Array of priority scores between 0.0 and 1.0, in input order
+        """
+        if not rows:
+            return np.zeros(0)
         
-        # Combine scores (weighted sum, capped at 1.0)
-        total_score = sum(scores)
-        total_score = min(total_score, 1.0)
+        # Row-wise weighted sums add the factors in the same order as
+        # calculate_priority_score, so batched and single scores are identical
+        features = np.array([self._score_features(**row) for row in rows])
+        return np.clip((features * self.feature_weights).sum(axis=1), 0.0, 1.0)
+    
+    def _score_features(self,
+                        text: Union[str, PreparedText],
+                        sentiment: str = 'NEUTRAL',
+                        sentiment_confidence: float = 0.0,
+                        category: str = 'question',
+                        sender_email: Optional[str] = None,
+                        sender_id: Optional[str] = None,
+                        channel_type: Optional[str] = None,
+                        is_vip: Optional[bool] = None) -> List[float]:
+        """Individual factor scores, ordered as feature_weights."""
+        # Check VIP status
+        if is_vip is None:
+            is_vip = self.check_vip_status(sender_email, sender_id)
         
-        return total_score
+        return [
+            self.VIP_SCORE if is_vip else 0.0,  # VIP customers get priority boost
+            self.score_urgency_keywords(text),
+            self.score_sentiment(sentiment, sentiment_confidence),
+            self.score_category(category),
+            self.score_channel(channel_type),
+            self.score_length(text)
+        ]
     
     def determine_priority(self, score: float) -> str:
         """
@@ -207,30 +239,33 @@ class PriorityScorer:
             return 'LOW'
     
     def classify_priority(self,
-                          text: str,
+                          text: Union[str, PreparedText],
                           sentiment: str = 'NEUTRAL',
                           sentiment_confidence: float = 0.0,
                           category: str = 'question',
                           sender_email: Optional[str] = None,
                           sender_id: Optional[str] = None,
                           channel_type: Optional[str] = None,
-                          is_vip: Optional[bool] = None) -> Tuple[str, float, bool]:
+                          is_vip: Optional[bool] = None) -> Tuple[str, float, bool, bool]:
         """
         Classify priority level and determine if urgent.
         
         Args:
-            text: Query content
+            text: Query content, or the PreparedText built for it
             sentiment: Sentiment classification
             sentiment_confidence: Confidence of sentiment analysis
             category: Category classification
             sender_email: Sender email address
             sender_id: Sender ID
             channel_type: Channel type
-            is_vip: Explicit VIP status
+            is_vip: Explicit VIP status (if None, will check)
         
         Returns:
-            Tuple of (priority_level, score, is_urgent)
+            Tuple of (priority_level, score, is_urgent, is_vip)
         """
+        if is_vip is None:
+            is_vip = self.check_vip_status(sender_email, sender_id)
+        
         score = self.calculate_priority_score(
             text=text,
             sentiment=sentiment,
@@ -247,6 +282,28 @@ class PriorityScorer:
         # Urgent if score >= HIGH threshold or is CRITICAL
         is_urgent = score >= self.PRIORITY_THRESHOLDS['HIGH']
         
-        return (priority, score, is_urgent)
+        return (priority, score, is_urgent, is_vip)
+    
+    def classify_priority_batch(self, rows: List[Dict]) -> List[Tuple[str, float, bool, bool]]:
+        """
+        Classify the priority of several queries, scoring them in one vectorized pass.
+        
+        Args:
+            rows: Keyword arguments of classify_priority, one dict per query
+        
+        Returns:
+            List of (priority_level, score, is_urgent, is_vip) tuples in input order
+        """
+        rows = [
+            row if row.get('is_vip') is not None
+            else {**row, 'is_vip': self.check_vip_status(row.get('sender_email'), row.get('sender_id'))}
+            for row in rows
+        ]
+        scores = self.score_batch(rows)
+        
+        return [
+            (self.determine_priority(score), score, score >= self.PRIORITY_THRESHOLDS['HIGH'], row['is_vip'])
+            for row, score in zip(rows, scores.tolist())
+        ]
 
 
@@ -0,0 +1,9 @@
+from .onnx_runtime import ONNX_RUNTIME_AVAILABLE, load_quantized_onnx_model
+from .fingerprint_cache import FingerprintCache, text_digest
+from .model_loader import load_sequence_classifier
+from .precision import autocast_for, gpu_half_dtype
+
+__all__ = [
+    'ONNX_RUNTIME_AVAILABLE', 'load_quantized_onnx_model', 'FingerprintCache', 'text_digest',
+    'load_sequence_classifier', 'autocast_for', 'gpu_half_dtype'
+]
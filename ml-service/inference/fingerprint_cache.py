@@ -0,0 +1,148 @@
+"""
+Fingerprint cache for transformer model outputs.
+Serves repeated (and, optionally, near-duplicate) inputs from an LRU cache
+instead of running the model again.
+"""
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+import hashlib
+import re
+import threading
+
+_WORD_RE = re.compile(r'\w+')
+
+def text_digest(text: str) -> bytes:
+    """128-bit blake2b digest of text, used as a compact cache key."""
+    return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash of the lowercased words of text.
+
+    Texts sharing most of their words get fingerprints that differ in few bits.
+    """
+    weights = [0] * 64
+    for word in _WORD_RE.findall(text.lower()):
+        word_hash = int.from_bytes(hashlib.blake2b(word.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+        for bit in range(64):
+            if word_hash >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+class FingerprintCache:
+    """Thread-safe LRU cache of per-text model outputs."""
+    
+    def __init__(self, maxsize: int = 10000, near_duplicate_bits: int = 0, bank_size: int = 256):
+        """
+        Initialize the cache.
+        
+        Args:
+            maxsize: Maximum number of cached outputs (0 disables caching)
+            near_duplicate_bits: Maximum SimHash Hamming distance at which a cached output
+                is reused for a different text (0 only reuses outputs for identical text)
+            bank_size: Number of recent fingerprints searched for near duplicates
+        """
+        self.maxsize = maxsize
+        self.near_duplicate_bits = near_duplicate_bits
+        
+        self._entries = OrderedDict()
+        self._fingerprints = deque(maxlen=bank_size)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._near_hits = 0
+        self._misses = 0
+    
+    def get_or_compute(self, texts: List[str], compute: Callable[[List[str]], List[Any]]) -> List[Any]:
+        """
+        Return the model output for each text, computing only the uncached ones.
+        
+        Cached outputs are shared between callers and must be treated as read-only.
+        
+        Args:
+            texts: Model inputs
+            compute: Runs the model on a list of texts and returns one output per text
+        
+        Returns:
+            List of outputs in input order
+        """
+        if self.maxsize <= 0:
+            return compute(texts)
+        
+        keys = [text_digest(text) for text in texts]
+        fingerprints = [None] * len(texts)
+        results = [None] * len(texts)
+        missing: Dict[bytes, List[int]] = {}
+        
+        with self._lock:
+            for index, key in enumerate(keys):
+                result = self._entries.get(key)
+                if result is not None:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    results[index] = result
+                elif key in missing:
+                    missing[key].append(index)
+                else:
+                    missing[key] = [index]
+        
+        if self.near_duplicate_bits > 0:
+            for key, indices in list(missing.items()):
+                fingerprint = simhash(texts[indices[0]])
+                result = self._near_lookup(fingerprint)
+                if result is None:
+                    for index in indices:
+                        fingerprints[index] = fingerprint
+                    continue
+                for index in indices:
+                    results[index] = result
+                del missing[key]
+        
+        if not missing:
+            return results
+        
+        pending = [indices[0] for indices in missing.values()]
+        outputs = compute([texts[index] for index in pending])
+        
+        with self._lock:
+            for (key, indices), result in zip(missing.items(), outputs):
+                self._misses += 1
+                for index in indices:
+                    results[index] = result
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                if fingerprints[indices[0]] is not None:
+                    self._fingerprints.append((fingerprints[indices[0]], key))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        
+        return results
+    
+    def _near_lookup(self, fingerprint: int) -> Optional[Any]:
+        with self._lock:
+            for cached_fingerprint, key in reversed(self._fingerprints):
+                if (fingerprint ^ cached_fingerprint).bit_count() > self.near_duplicate_bits:
+                    continue
+                result = self._entries.get(key)
+                if result is not None:
+                    self._entries.move_to_end(key)
+                    self._near_hits += 1
+                    return result
+        return None
+    
+    def cache_info(self) -> Dict[str, int]:
+        """Return hit/miss statistics for the cache."""
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'near_hits': self._near_hits,
+                'misses': self._misses,
+                'maxsize': self.maxsize,
+                'currsize': len(self._entries)
+            }
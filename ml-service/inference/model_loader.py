@@ -0,0 +1,60 @@
+"""
+Shared loading of the transformer sequence classifiers.
+Each model is loaded once per process and reused by every analyzer that asks
+for it with the same options.
+"""
+from typing import Any, Dict, Tuple
+
+from .onnx_runtime import load_quantized_onnx_model
+from .precision import gpu_half_dtype
+
+# Loaded (tokenizer, model) pairs, keyed by model id and load options
+_MODEL_CACHE: Dict[Tuple, Tuple[Any, Any]] = {}
+
+def load_sequence_classifier(model_id: str, use_onnx: bool = False, quantize: bool = False) -> Tuple[Any, Any]:
+    """
+    Load a sequence classification model and its tokenizer, reusing them if already loaded.
+    
+    The model is meant to be called directly, so no HF pipeline is built.
+    
+    Args:
+        model_id: Hugging Face model id
+        use_onnx: If True, load an int8 quantized ONNX Runtime version of the model
+        quantize: If True, dynamically quantize the PyTorch model's Linear layers to int8 (CPU only)
+    
+    Returns:
+        Tuple of (tokenizer, model)
+    """
+    key = (model_id, use_onnx, quantize)
+    if key not in _MODEL_CACHE:
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        # Always use the Rust-backed fast tokenizer
+        tokenizer = AutoTokenizer.from_pretrained(model_id, use_fast=True)
+        if use_onnx:
+            model = load_quantized_onnx_model(model_id)
+        else:
+            model = AutoModelForSequenceClassification.from_pretrained(model_id).eval()
+            half_dtype = gpu_half_dtype()
+            if half_dtype is not None:
+                # Half-precision weights on GPU; quantization is CPU-only
+                model = model.to('cuda', dtype=half_dtype)
+            elif quantize:
+                model = quantize_dynamic(model)
+        _MODEL_CACHE[key] = (tokenizer, model)
+    return _MODEL_CACHE[key]
+
+def quantize_dynamic(model):
+    """
+    Store Linear weights as int8 and quantize activations on the fly.
+    
+    Args:
+        model: FP32 PyTorch model on the CPU
+    
+    Returns:
+        Dynamically quantized copy of the model
+    """
+    import torch
+    
+    if 'fbgemm' in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = 'fbgemm'
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
@@ -0,0 +1,83 @@
+"""
+ONNX Runtime loading for the transformer models.
+Exports a Hugging Face model to ONNX once, quantizes its weights to int8 and
+caches the result on disk so later boots load it directly.
+"""
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Try to import ONNX Runtime via optimum (optional - PyTorch pipelines are used if unavailable)
+try:
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    ONNX_RUNTIME_AVAILABLE = True
+except ImportError:
+    ONNX_RUNTIME_AVAILABLE = False
+
+ONNX_CACHE_DIR = os.getenv(
+    'ONNX_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'query-tracking-ml', 'onnx')
+)
+
+QUANTIZED_FILE_NAME = 'model_quantized.onnx'
+
+def _export_quantized(model_id: str, model_dir: str):
+    """
+    Export and quantize a model into model_dir.
+    
+    The files are written to a private staging directory that is renamed into
+    place once complete, so concurrent workers never see a partial export.
+    """
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='.export-', dir=ONNX_CACHE_DIR)
+    try:
+        logger.info("Exporting %s to ONNX and quantizing to int8 (one-time)", model_id)
+        model = ORTModelForSequenceClassification.from_pretrained(
+            model_id,
+            export=True,
+            provider="CPUExecutionProvider"
+        )
+        model.save_pretrained(staging_dir)
+        quantize_dynamic(
+            os.path.join(staging_dir, 'model.onnx'),
+            os.path.join(staging_dir, QUANTIZED_FILE_NAME),
+            weight_type=QuantType.QInt8
+        )
+        
+        try:
+            os.replace(staging_dir, model_dir)
+        except OSError:
+            # Another worker moved its export into place first; use that one
+            if not os.path.exists(os.path.join(model_dir, QUANTIZED_FILE_NAME)):
+                raise
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+def load_quantized_onnx_model(model_id: str):
+    """
+    Load an int8 dynamically quantized ONNX Runtime version of a sequence classifier.
+    
+    Args:
+        model_id: Hugging Face model id
+    
+    Returns:
+        ORTModelForSequenceClassification running on the CPU execution provider
+    """
+    if not ONNX_RUNTIME_AVAILABLE:
+        raise ImportError("optimum[onnxruntime] is required for ONNX Runtime inference")
+    
+    model_dir = os.path.join(ONNX_CACHE_DIR, model_id.replace('/', '__'))
+    quantized_path = os.path.join(model_dir, QUANTIZED_FILE_NAME)
+    
+    if not os.path.exists(quantized_path):
+        _export_quantized(model_id, model_dir)
+    
+    return ORTModelForSequenceClassification.from_pretrained(
+        model_dir,
+        file_name=QUANTIZED_FILE_NAME,
+        provider="CPUExecutionProvider"
+    )
@@ -0,0 +1,36 @@
+"""
+Mixed-precision helpers for the transformer models.
+Runs GPU inference in bfloat16 (or float16 where bf16 is unsupported); CPU
+inference keeps FP32 weights and relies on int8 quantization instead.
+"""
+from functools import cache
+import contextlib
+
+# Try to import torch (optional - only needed for transformer models)
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except ImportError:
+    TORCH_AVAILABLE = False
+
+@cache
+def gpu_half_dtype():
+    """Half-precision dtype for CUDA inference, or None when no GPU is available."""
+    if not (TORCH_AVAILABLE and torch.cuda.is_available()):
+        return None
+    return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+def autocast_for(model):
+    """
+    Autocast context for a forward pass of model.
+
+    Args:
+        model: PyTorch module (or any other model object)
+
+    Returns:
+        Half-precision autocast on CUDA, a no-op context otherwise
+    """
+    device = getattr(model, 'device', None)
+    if TORCH_AVAILABLE and isinstance(model, torch.nn.Module) and device is not None and device.type == 'cuda':
+        return torch.autocast(device_type='cuda', dtype=gpu_half_dtype())
+    return contextlib.nullcontext()
@@ -1,4 +1,4 @@
 
-from .text_preprocessor import TextPreprocessor
+from .text_preprocessor import TextPreprocessor, PreparedText
 
-__all__ = ['TextPreprocessor']
+__all__ = ['TextPreprocessor', 'PreparedText']
@@ -0,0 +1,118 @@
+"""
+Shared keyword index.
+Defines every keyword table used by the classifiers and compiles them into a
+single Aho-Corasick automaton, so a query is scanned once for all of them.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Tuple
+
+# Try to import pyahocorasick (optional - falls back to substring scans)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Keyword patterns for each category (keyword-based category classification)
+CATEGORY_KEYWORDS = {
+    'question': ('how', 'what', 'when', 'where', 'why', 'who', 'can', 'could', 'would', 'should', '?'),
+    'complaint': ('complaint', 'unhappy', 'disappointed', 'frustrated', 'angry', 'terrible', 'worst', 'awful', 'horrible', 'bad'),
+    'compliment': ('great', 'excellent', 'awesome', 'amazing', 'love', 'thank', 'thanks', 'appreciate', 'good job'),
+    'bug_report': ('bug', 'error', 'broken', 'not working', 'issue', 'problem', 'crash', 'failed', 'failure'),
+    'feature_request': ('feature', 'add', 'suggestion', 'wish', 'would like', 'could you', 'please add'),
+    'request': ('request', 'need', 'want', 'require', 'looking for', 'interested in'),
+    'support_request': ('help', 'support', 'assist', 'guidance', 'trouble', 'difficulty'),
+    'purchase_inquiry': ('price', 'cost', 'buy', 'purchase', 'order', 'payment', 'shipping', 'delivery'),
+    'feedback': ('feedback', 'opinion', 'thought', 'suggest', 'improve', 'better')
+}
+
+# Urgency levels feeding the priority score
+PRIORITY_KEYWORDS = {
+    'critical': ('urgent', 'critical', 'emergency', 'asap', 'immediately', 'now', 'crisis', 'down', 'broken', 'not working'),
+    'high': ('important', 'soon', 'quickly', 'priority', 'needed', 'required', 'issue', 'problem'),
+    'negative': ('angry', 'frustrated', 'disappointed', 'terrible', 'worst', 'awful', 'unacceptable')
+}
+
+# Urgency-related keywords reported with each analysis
+URGENCY_KEYWORDS = (
+    ('critical', ('urgent', 'critical', 'emergency', 'asap', 'immediately', 'now', 'crisis')),
+    ('high', ('important', 'soon', 'quickly', 'priority', 'needed', 'required')),
+    ('negative', ('broken', 'error', 'bug', 'issue', 'problem', 'failed', 'not working', 'down')),
+    ('positive', ('thank', 'great', 'excellent', 'awesome', 'love', 'amazing')),
+    ('question', ('how', 'what', 'when', 'where', 'why', 'who', 'can', 'could', 'would')),
+    ('complaint', ('complaint', 'unhappy', 'disappointed', 'frustrated', 'angry', 'terrible', 'worst')),
+    ('compliment', ('compliment', 'praise', 'appreciate', 'happy', 'satisfied', 'pleased'))
+)
+
+# Every keyword dictionary as (table, group); its position is its bit in KEYWORD_TO_BITS
+_TABLES = (
+    ('category', tuple(CATEGORY_KEYWORDS.items())),
+    ('priority', tuple(PRIORITY_KEYWORDS.items())),
+    ('urgency', URGENCY_KEYWORDS)
+)
+DICTIONARIES = tuple((table, group) for table, groups in _TABLES for group, _ in groups)
+DICTIONARY_INDEX = {dictionary: i for i, dictionary in enumerate(DICTIONARIES)}
+
+def _build_keyword_bits() -> Dict[str, int]:
+    keyword_bits: Dict[str, int] = {}
+    for table, groups in _TABLES:
+        for group, keywords in groups:
+            bit = 1 << DICTIONARY_INDEX[(table, group)]
+            for keyword in keywords:
+                keyword_bits[keyword] = keyword_bits.get(keyword, 0) | bit
+    return keyword_bits
+
+def _build_automaton():
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    automaton = ahocorasick.Automaton()
+    for kw_id, keyword in enumerate(KEYWORDS):
+        automaton.add_word(keyword, kw_id)
+    automaton.make_automaton()
+    return automaton
+
+KEYWORD_TO_BITS = _build_keyword_bits()
+KEYWORDS = tuple(KEYWORD_TO_BITS)
+_KEYWORD_BITS = tuple(KEYWORD_TO_BITS.values())
+AUTOMATON = _build_automaton()
+
+@dataclass(frozen=True, slots=True)
+class KeywordHits:
+    """Distinct keywords found in a text and their count per dictionary."""
+    keywords: FrozenSet[str]
+    counts: Tuple[int, ...]
+    
+    def count(self, table: str, group: str) -> int:
+        """Number of distinct keywords of one dictionary found in the text."""
+        return self.counts[DICTIONARY_INDEX[(table, group)]]
+
+@lru_cache(maxsize=1024)
+def scan(text: str) -> KeywordHits:
+    """
+    Find every indexed keyword in text with a single pass.
+    
+    Results are cached, so the scorers reading the same query text share one scan.
+    
+    Args:
+        text: Lowercased text to scan
+    
+    Returns:
+        KeywordHits for the text
+    """
+    if AUTOMATON is not None:
+        found = {kw_id for _, kw_id in AUTOMATON.iter(text)}
+    else:
+        found = {kw_id for kw_id, keyword in enumerate(KEYWORDS) if keyword in text}
+    
+    counts = [0] * len(DICTIONARIES)
+    for kw_id in found:
+        bits = _KEYWORD_BITS[kw_id]
+        while bits:
+            counts[(bits & -bits).bit_length() - 1] += 1
+            bits &= bits - 1
+    
+    return KeywordHits(
+        keywords=frozenset(KEYWORDS[kw_id] for kw_id in found),
+        counts=tuple(counts)
+    )
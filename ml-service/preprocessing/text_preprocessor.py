@@ -2,29 +2,51 @@
 Text preprocessing pipeline for query content.
 Handles cleaning, normalization, and preparation for ML models.
 """
+import heapq
 import re
 import string
 import unicodedata
-from typing import List, Optional
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import List, Optional, Union
 import nltk
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 from nltk.stem import PorterStemmer
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt', quiet=True)
+from .keyword_index import URGENCY_KEYWORDS, scan as scan_keywords
 
+# Download required NLTK data
 try:
     nltk.data.find('corpora/stopwords')
 except LookupError:
     nltk.download('stopwords', quiet=True)
 
+# Cleaning patterns, compiled once at import
+_URL_RE = re.compile(r'https?://\S+')
+_WWW_RE = re.compile(r'www\.\S+')
+_EMAIL_RE = re.compile(r'\S+@\S+')
+_MENTION_RE = re.compile(r'@\w+')
+_HASHTAG_RE = re.compile(r'#\w+')
+# Word tokens, keeping contractions such as "don't" together
+_TOKEN_RE = re.compile(r"\w+(?:'\w+)?")
+# Keyword candidates: runs of at least four letters or digits, in any script
+_KEYWORD_RE = re.compile(r'[^\W_]{4,}')
+
+_PUNCTUATION = frozenset(string.punctuation)
+
+@dataclass(frozen=True, slots=True)
+class PreparedText:
+    """Query text normalized once and shared by every downstream scorer."""
+    cleaned: str
+    lowered: str
+    word_count: int
+
 class TextPreprocessor:
     """Text preprocessing pipeline for ML models."""
     
+    # Urgency-related keyword table, shared with the keyword index
+    URGENCY_KEYWORDS = URGENCY_KEYWORDS
+    
     def __init__(self, 
                  remove_stopwords: bool = True,
                  remove_urls: bool = True,
@@ -42,11 +64,38 @@ class TextPreprocessor:
         self.lowercase = lowercase
         self.normalize_unicode = normalize_unicode
         
+        # URLs are removed first, one pattern at a time, because stripping one
+        # can change what the later patterns see; each pass is skipped when its
+        # marker substring is absent
+        self._url_passes = (('://', _URL_RE), ('www.', _WWW_RE)) if remove_urls else ()
+        
+        # Emails, mentions and hashtags are fused into one alternation so the
+        # text is scanned once for all of them. This matches running them in
+        # sequence: an email match always spans a whole token, and mentions and
+        # hashtags only consume word characters, so no match creates or hides
+        # another
+        strip_patterns = []
+        # Substrings every fused match must contain, checked before running the regex
+        strip_markers = set()
+        if remove_emails:
+            strip_patterns.append(_EMAIL_RE.pattern)
+            strip_markers.add('@')
+        if remove_mentions:
+            strip_patterns.append(_MENTION_RE.pattern)
+            strip_markers.add('@')
+        if remove_hashtags:
+            strip_patterns.append(_HASHTAG_RE.pattern)
+            strip_markers.add('#')
+        self._strip_re = re.compile('|'.join(strip_patterns)) if strip_patterns else None
+        self._strip_markers = tuple(strip_markers)
+        
         try:
-            self.stop_words = set(stopwords.words('english'))
+            stop_words = stopwords.words('english')
         except LookupError:
             nltk.download('stopwords', quiet=True)
-            self.stop_words = set(stopwords.words('english'))
+            stop_words = stopwords.words('english')
+        # Punctuation is folded in so token filtering is a single set lookup
+        self.stop_words = frozenset(stop_words) | _PUNCTUATION
         
         self.stemmer = PorterStemmer()
     
@@ -60,25 +109,17 @@ class TextPreprocessor:
             text = unicodedata.normalize('NFKD', text)
         
         # Remove URLs
-        if self.remove_urls:
-            text = re.sub(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-            text = re.sub(r'www\.(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+        for marker, pattern in self._url_passes:
+            if marker in text:
+                text = pattern.sub('', text)
         
-        # Remove email addresses
-        if self.remove_emails:
-            text = re.sub(r'\S+@\S+', '', text)
+        # Remove email addresses, mentions (e.g., @username) and, optionally,
+        # hashtags (kept by default for context)
+        if self._strip_re is not None and any(marker in text for marker in self._strip_markers):
+            text = self._strip_re.sub('', text)
         
-        # Remove mentions (e.g., @username)
-        if self.remove_mentions:
-            text = re.sub(r'@\w+', '', text)
-        
-        # Remove hashtags (optional - keep by default for context)
-        if self.remove_hashtags:
-            text = re.sub(r'#\w+', '', text)
-        
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
+        # Collapse runs of whitespace and strip the ends in one pass
+        text = ' '.join(text.split())
         
         # Convert to lowercase
         if self.lowercase:
@@ -88,12 +129,7 @@ class TextPreprocessor:
     
     def tokenize(self, text: str) -> List[str]:
         """Tokenize text into words."""
-        try:
-            tokens = word_tokenize(text)
-            return tokens
-        except:
-            # Fallback to simple split
-            return text.split()
+        return _TOKEN_RE.findall(text)
     
     def remove_stopwords_from_tokens(self, tokens: List[str]) -> List[str]:
         """Remove stopwords from token list."""
@@ -122,50 +158,76 @@ class TextPreprocessor:
         cleaned = self.clean_text(text)
         
         if tokenize:
-            tokens = self.tokenize(cleaned)
-            tokens = self.remove_stopwords_from_tokens(tokens)
-            
-            if stem:
-                tokens = self.stem_tokens(tokens)
-            
-            # Filter out punctuation and short tokens
-            tokens = [t for t in tokens if len(t) > 1 and t not in string.punctuation]
-            return tokens
+            return self._tokenize_cleaned(cleaned, stem=stem)
         
         return cleaned
     
-    def extract_keywords(self, text: str, max_keywords: int = 10) -> List[str]:
-        """Extract keywords from text."""
-        tokens = self.preprocess(text, tokenize=True)
+    def _tokenize_cleaned(self, cleaned: str, stem: bool = False) -> List[str]:
+        excluded = self.stop_words if self.remove_stopwords else _PUNCTUATION
+        tokens = self.tokenize(cleaned)
+        
+        # Filter out stopwords, punctuation and short tokens (and stem) in one pass
+        if stem:
+            stem_token = self.stemmer.stem
+            return [stem_token(t) for t in tokens if len(t) > 1 and t not in excluded]
+        return [t for t in tokens if len(t) > 1 and t not in excluded]
+    
+    def prepare(self, text: str) -> PreparedText:
+        """
+        Clean and lowercase text once for all downstream consumers.
+        
+        Args:
+            text: Raw query text
         
-        # Filter out common words and short tokens
-        keywords = [t for t in tokens if len(t) > 3 and t.isalnum()]
+        Returns:
+            PreparedText with the cleaned string, its lowercase form and word count
+        """
+        cleaned = self.clean_text(text)
+        lowered = cleaned if self.lowercase else cleaned.lower()
+        
+        return PreparedText(
+            cleaned=cleaned,
+            lowered=lowered,
+            # Whitespace is already collapsed to single spaces by clean_text
+            word_count=cleaned.count(' ') + 1 if cleaned else 0
+        )
+    
+    def extract_keywords(self, text: Union[str, PreparedText], max_keywords: int = 10) -> List[str]:
+        """Extract keywords from text (or already prepared text)."""
+        if isinstance(text, PreparedText):
+            text_lower = text.lowered
+        else:
+            text_lower = self.clean_text(text).lower()
+        
+        # Recompose characters split by NFKD (e.g. 'ü', 'é', 'й') so accented
+        # words are matched whole
+        text_lower = unicodedata.normalize('NFC', text_lower)
+        
+        # Count keyword candidates straight from the text, skipping stopwords
+        excluded = self.stop_words if self.remove_stopwords else frozenset()
+        keyword_counts = {}
+        for t in _KEYWORD_RE.findall(text_lower):
+            if t not in excluded:
+                keyword_counts[t] = keyword_counts.get(t, 0) + 1
         
         # Return top keywords by frequency
-        from collections import Counter
-        keyword_counts = Counter(keywords)
-        return [word for word, _ in keyword_counts.most_common(max_keywords)]
+        return [word for word, _ in heapq.nlargest(max_keywords, keyword_counts.items(), key=itemgetter(1))]
     
-    def detect_urgency_keywords(self, text: str) -> dict:
-        """Detect urgency-related keywords in text."""
-        urgency_keywords = {
-            'critical': ['urgent', 'critical', 'emergency', 'asap', 'immediately', 'now', 'crisis'],
-            'high': ['important', 'soon', 'quickly', 'priority', 'needed', 'required'],
-            'negative': ['broken', 'error', 'bug', 'issue', 'problem', 'failed', 'not working', 'down'],
-            'positive': ['thank', 'great', 'excellent', 'awesome', 'love', 'amazing'],
-            'question': ['how', 'what', 'when', 'where', 'why', 'who', 'can', 'could', 'would'],
-            'complaint': ['complaint', 'unhappy', 'disappointed', 'frustrated', 'angry', 'terrible', 'worst'],
-            'compliment': ['compliment', 'praise', 'appreciate', 'happy', 'satisfied', 'pleased']
-        }
-        
-        text_lower = text.lower()
+    def detect_urgency_keywords(self, text: Union[str, PreparedText]) -> dict:
+        """Detect urgency-related keywords in text (or already prepared text)."""
+        if isinstance(text, PreparedText):
+            text_lower = text.lowered
+        else:
+            text_lower = text.lower()
+        hits = scan_keywords(text_lower)
         detected = {}
         
-        for category, keywords in urgency_keywords.items():
-            matches = [kw for kw in keywords if kw in text_lower]
+        # Report matches in table order
+        for category, keywords in self.URGENCY_KEYWORDS:
+            if not hits.count('urgency', category):
+                continue
+            matches = [kw for kw in keywords if kw in hits.keywords]
             if matches:
                 detected[category] = matches
         
         return detected
-
-
@@ -1,38 +1,64 @@
 """
 Sentiment analysis module using VADER and transformer models.
 """
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import logging
 
+try:
+    from ..inference.fingerprint_cache import FingerprintCache
+    from ..inference.model_loader import load_sequence_classifier
+    from ..inference.precision import autocast_for
+except ImportError:
+    from inference.fingerprint_cache import FingerprintCache
+    from inference.model_loader import load_sequence_classifier
+    from inference.precision import autocast_for
+
 logger = logging.getLogger(__name__)
 
 class SentimentAnalyzer:
     """Sentiment analysis using VADER and optionally transformer models."""
     
-    def __init__(self, use_transformer: bool = False):
+    MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+    
+    # Token limit per input; queries rarely need more and shorter inputs pad less
+    MAX_LENGTH = 256
+    
+    # Texts per forward pass when analyzing a batch
+    BATCH_SIZE = 32
+    
+    # Sentiment for each output class index of the model
+    LABELS = ('NEGATIVE', 'NEUTRAL', 'POSITIVE')
+    
+    def __init__(self,
+                 use_transformer: bool = False,
+                 use_onnx: bool = False,
+                 cache_size: int = 10000,
+                 near_duplicate_bits: int = 0,
+                 fast_confidence: float = 0.2):
         """
         Initialize sentiment analyzer.
         
         Args:
             use_transformer: If True, use transformer model for better accuracy (slower)
+            use_onnx: If True, run the transformer as an int8 quantized ONNX Runtime model
+            cache_size: Number of transformer results kept for repeated texts (0 disables the cache)
+            near_duplicate_bits: SimHash distance within which a cached result is reused (0 for exact text only)
+            fast_confidence: VADER |compound| at or above which the transformer is skipped
         """
         self.use_transformer = use_transformer
+        self.fast_confidence = fast_confidence
         self.vader_analyzer = SentimentIntensityAnalyzer()
         self.transformer_model = None
         self.transformer_tokenizer = None
+        self.transformer_cache = FingerprintCache(maxsize=cache_size, near_duplicate_bits=near_duplicate_bits)
         
         if use_transformer:
             try:
-                from transformers import pipeline
-                self.sentiment_pipeline = pipeline(
-                    "sentiment-analysis",
-                    model="cardiffnlp/twitter-roberta-base-sentiment-latest",
-                    return_all_scores=True
-                )
+                self.transformer_tokenizer, self.transformer_model = load_sequence_classifier(self.MODEL_NAME, use_onnx)
                 logger.info("Transformer sentiment model loaded successfully")
             except Exception as e:
-                logger.warning(f"Could not load transformer model: {e}. Falling back to VADER.")
+                logger.warning("Could not load transformer model: %s. Falling back to VADER.", e)
                 self.use_transformer = False
     
     def analyze_vader(self, text: str) -> Dict[str, any]:
@@ -75,43 +101,64 @@ class SentimentAnalyzer:
         Returns:
             Dictionary with sentiment scores and classification
         """
-        if not self.use_transformer or self.sentiment_pipeline is None:
+        if not self.use_transformer or self.transformer_model is None:
             return self.analyze_vader(text)
         
         try:
-            results = self.sentiment_pipeline(text[:512])  # Limit length for transformer
-            
-            # Map transformer labels to our sentiment labels
-            label_mapping = {
-                'LABEL_0': 'NEGATIVE',
-                'LABEL_1': 'NEUTRAL',
-                'LABEL_2': 'POSITIVE'
-            }
-            
-            scores = {}
-            max_score = 0
-            predicted_label = 'NEUTRAL'
-            
-            for result in results[0]:
-                label = label_mapping.get(result['label'], result['label'])
-                score = result['score']
-                scores[label.lower()] = score
-                
-                if score > max_score:
-                    max_score = score
-                    predicted_label = label
-            
-            return {
-                'sentiment': predicted_label,
-                'positive': scores.get('positive', 0.0),
-                'neutral': scores.get('neutral', 0.0),
-                'negative': scores.get('negative', 0.0),
-                'confidence': max_score
-            }
+            probabilities = self._transformer_cached([text[:512]])[0]  # Limit length for transformer
+            return self._format_transformer_result(probabilities)
         except Exception as e:
-            logger.error(f"Error in transformer sentiment analysis: {e}")
+            logger.error("Error in transformer sentiment analysis: %s", e)
             return self.analyze_vader(text)
     
+    def warmup(self, text: str):
+        """
+        Run the transformer model once, raising on failure instead of falling back to VADER.
+        
+        Args:
+            text: Input text to analyze
+        """
+        if self.use_transformer and self.transformer_model is not None:
+            self._run_transformer([text])
+    
+    def _transformer_cached(self, texts: List[str]) -> List[List[float]]:
+        """Class probabilities for texts, running the model only for uncached texts."""
+        return self.transformer_cache.get_or_compute(texts, self._run_transformer)
+    
+    def _run_transformer(self, texts: List[str]) -> List[List[float]]:
+        import torch
+        
+        probabilities = []
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            # Pad only to the longest text in this batch, not to the model maximum
+            batch = self.transformer_tokenizer(
+                texts[start:start + self.BATCH_SIZE],
+                padding='longest',
+                truncation=True,
+                max_length=self.MAX_LENGTH,
+                return_tensors='pt'
+            )
+            batch = {key: value.to(self.transformer_model.device) for key, value in batch.items()}
+            
+            with torch.inference_mode(), autocast_for(self.transformer_model):
+                logits = self.transformer_model(**batch).logits
+            
+            probabilities.extend(logits.float().softmax(dim=-1).tolist())
+        return probabilities
+    
+    def _format_transformer_result(self, probabilities: List[float]) -> Dict[str, any]:
+        """Convert class probabilities into our sentiment result format."""
+        scores = dict(zip(self.LABELS, probabilities))
+        predicted_label = max(scores, key=scores.get)
+        
+        return {
+            'sentiment': predicted_label,
+            'positive': scores['POSITIVE'],
+            'neutral': scores['NEUTRAL'],
+            'negative': scores['NEGATIVE'],
+            'confidence': scores[predicted_label]
+        }
+    
     def analyze(self, text: str) -> Dict[str, any]:
         """
         Analyze sentiment of text.
@@ -131,9 +178,51 @@ class SentimentAnalyzer:
                 'confidence': 0.0
             }
         
-        if self.use_transformer:
+        # VADER settles clearly polar text; only the near-neutral zone goes to the transformer
+        vader_result = self.analyze_vader(text)
+        if self.use_transformer and vader_result['confidence'] < self.fast_confidence:
             return self.analyze_transformer(text)
-        else:
-            return self.analyze_vader(text)
-
-
+        return vader_result
+    
+    def analyze_batch(self, texts: List[str]) -> List[Dict[str, any]]:
+        """
+        Analyze sentiment of several texts, sending the ones VADER is unsure about
+        to the transformer in batched model calls.
+        
+        Args:
+            texts: Input texts to analyze
+        
+        Returns:
+            List of sentiment results in input order
+        """
+        results = [None] * len(texts)
+        pending = []
+        
+        for index, text in enumerate(texts):
+            if not text or len(text.strip()) == 0:
+                results[index] = self.analyze(text)
+            else:
+                pending.append(index)
+        
+        if not pending:
+            return results
+        
+        for index in pending:
+            results[index] = self.analyze_vader(texts[index])
+        
+        if not (self.use_transformer and self.transformer_model is not None):
+            return results
+        
+        uncertain = [index for index in pending if results[index]['confidence'] < self.fast_confidence]
+        if not uncertain:
+            return results
+        
+        try:
+            batch = [texts[index][:512] for index in uncertain]  # Limit length for transformer
+            outputs = self._transformer_cached(batch)
+            for index, label_scores in zip(uncertain, outputs):
+                results[index] = self._format_transformer_result(label_scores)
+        except Exception as e:
+            logger.error("Error in batched transformer sentiment analysis: %s", e)
+        
+        return results